@@ -0,0 +1,589 @@
+# Import Dependencies
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from os import path
+from statement_reader import STATEMENTS
+
+crawl_job = namedtuple('crawl_job', ['id', 'symbol', 'statement', 'token'])
+crawl_job.__doc__ = """
+    A (symbol, statement) job leased to a worker.
+
+    Attributes
+    ----------
+    id : int
+            The row id of the job in the queue
+    symbol : str
+            The stock ticker to scrape
+    statement : str
+            The report to scrape (balance-sheet, income-statement, cash-flow)
+            or competitors to look up the competitors of the symbol
+    token : int
+            The attempt number of the lease. Heartbeats and results carrying an
+            older token are rejected once the job has been leased again.
+    """
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_jobs (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    statement TEXT NOT NULL,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    UNIQUE (symbol, statement)
+);
+CREATE TABLE IF NOT EXISTS crawl_peers (
+    ticker TEXT NOT NULL,
+    competitor TEXT NOT NULL,
+    PRIMARY KEY (ticker, competitor)
+);
+CREATE TABLE IF NOT EXISTS crawl_results (
+    symbol TEXT NOT NULL,
+    statement TEXT NOT NULL,
+    period_type TEXT NOT NULL,
+    csv TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    PRIMARY KEY (symbol, statement, period_type)
+);
+"""
+
+
+class crawl_queue:
+    """
+    A work queue shared by several scraper nodes, stored in a SQLite file.
+
+    ...
+
+    Workers lease one (symbol, statement) job at a time for lease_seconds and keep
+    the lease alive with heartbeats while scraping. A job whose lease expires,
+    e.g. because its worker died, is handed to the next worker asking for work.
+    Results of every worker are written back into the same file and can be exported
+    into the dow_jones_stocks / all_competitors layout.
+
+    The file has to be on a local disk of one host. SQLite locking is not reliable over
+    network file systems and leases are stamped with the clock of the calling process.
+    Nodes on other machines go through crawl_server() and crawl_queue_client instead,
+    so every lease is checked against the clock of the coordinator.
+
+    Attributes
+    ----------
+    db_path : str
+            Path to the SQLite file
+    lease_seconds : float
+            How long a lease lasts without a heartbeat
+    max_attempts : int
+            How many times a job is leased before it is marked as failed
+
+    Methods
+    -------
+    enqueue(symbols, source="dow_jones_stocks", competitors=True):
+        Adds a job per statement (and a competitors job) for each symbol.
+
+    add_competitors(ticker, competitors):
+        Records the competitors of a ticker and adds their jobs.
+
+    lease(worker_id):
+        Returns the next job for the worker or None.
+
+    heartbeat(job):
+        Extends the lease of a job.
+
+    complete(job, worker_id, results=None, competitors=None):
+        Stores the results of a job and marks it as done.
+
+    release(job, error=None):
+        Gives a job back to the queue after a failed attempt.
+
+    counts():
+        Returns the number of jobs per status.
+
+    failed_jobs():
+        Returns the jobs marked as failed with the error of their last attempt.
+
+    export(data_dir="."):
+        Writes the results as csv files into the dow_jones_stocks / all_competitors layout.
+    """
+
+    def __init__(self, db_path, lease_seconds=120, max_attempts=3):
+        """
+        Constructs the queue and creates its tables if they do not exist.
+
+        Parameters
+        ----------
+        db_path : str
+                Path to the SQLite file
+        lease_seconds : float, optional
+                How long a lease lasts without a heartbeat
+        max_attempts : int, optional
+                How many times a job is leased before it is marked as failed
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            conn.executescript(SCHEMA)
+            # Queue files created before failed attempts were recorded
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(crawl_jobs)")]
+            if 'last_error' not in columns:
+                conn.execute("ALTER TABLE crawl_jobs ADD COLUMN last_error TEXT")
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Yields a connection inside a write transaction.
+
+        A new connection is opened on every call so the queue can be used from
+        several threads and processes at once. BEGIN IMMEDIATE takes the write lock
+        up front so two workers can never lease the same job.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def enqueue(self, symbols, source="dow_jones_stocks", competitors=True):
+        """
+        Adds a job per statement (and a competitors job) for each symbol.
+
+        Jobs that are already in the queue are left as they are.
+
+        Parameters
+        ----------
+        symbols : list
+                The stock tickers to scrape
+        source : str, optional
+                The directory the results are exported to (dow_jones_stocks or all_competitors)
+        competitors : bool, optional
+                Whether to also look up the competitors of each symbol on WSJ
+        """
+        statements = STATEMENTS + ["competitors"] if competitors else STATEMENTS
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO crawl_jobs (symbol, statement, source) VALUES (?, ?, ?)",
+                [(symbol, statement, source) for symbol in symbols for statement in statements])
+
+    def add_competitors(self, ticker, competitors):
+        """
+        Records the competitors of a ticker and adds their jobs.
+
+        Competitors listed with an exchange suffix (e.g. SIE.XE) are not on TD Ameritrade
+        and are skipped. A competitor that is already queued, such as another Dow Jones
+        stock, is only scraped once.
+
+        Parameters
+        ----------
+        ticker : str
+                The current company stock ticker
+        competitors : list
+                The competitors associated with the current company
+        """
+        with self._transaction() as conn:
+            self._add_competitors(conn, ticker, competitors)
+
+    def _add_competitors(self, conn, ticker, competitors):
+        competitors = [i for i in competitors if i != ticker and "." not in i]
+        conn.executemany(
+            "INSERT OR IGNORE INTO crawl_peers (ticker, competitor) VALUES (?, ?)",
+            [(ticker, competitor) for competitor in competitors])
+        conn.executemany(
+            "INSERT OR IGNORE INTO crawl_jobs (symbol, statement, source) VALUES (?, ?, 'all_competitors')",
+            [(competitor, statement) for competitor in competitors for statement in STATEMENTS])
+
+    def lease(self, worker_id):
+        """
+        Returns the next job for the worker or None.
+
+        Pending jobs and jobs whose lease has expired are handed out in the order they
+        were added. A job that has already been leased max_attempts times is marked as
+        failed instead.
+
+        Parameters
+        ----------
+        worker_id : str
+                Name of the worker, e.g. host name and process id
+
+        Returns
+        -------
+        crawl_job or None
+                The leased job, None when no job is available right now
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE crawl_jobs SET status = 'failed', worker = NULL, last_error = 'lease expired' "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, self.max_attempts))
+            row = conn.execute(
+                "SELECT id, symbol, statement, attempts FROM crawl_jobs "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            job_id, symbol, statement, attempts = row
+            conn.execute(
+                "UPDATE crawl_jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = ? "
+                "WHERE id = ?", (worker_id, now + self.lease_seconds, attempts + 1, job_id))
+        return crawl_job(job_id, symbol, statement, attempts + 1)
+
+    def heartbeat(self, job):
+        """
+        Extends the lease of a job.
+
+        Parameters
+        ----------
+        job : crawl_job
+                The job returned by lease()
+
+        Returns
+        -------
+        bool
+                False when the lease has been lost to another worker
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE crawl_jobs SET lease_expires = ? "
+                "WHERE id = ? AND attempts = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, job.id, job.token))
+        return cursor.rowcount == 1
+
+    def complete(self, job, worker_id, results=None, competitors=None):
+        """
+        Stores the results of a job and marks it as done.
+
+        Parameters
+        ----------
+        job : crawl_job
+                The job returned by lease()
+        worker_id : str
+                Name of the worker
+        results : dict, optional
+                csv text of the statement keyed by period type (annual, quarterly)
+        competitors : list, optional
+                The competitors found by a competitors job
+
+        Returns
+        -------
+        bool
+                False when the lease has been lost to another worker, the results are then dropped
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE crawl_jobs SET status = 'done', worker = ?, lease_expires = NULL "
+                "WHERE id = ? AND attempts = ? AND status = 'leased'",
+                (worker_id, job.id, job.token))
+            if cursor.rowcount != 1:
+                return False
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO crawl_results VALUES (?, ?, ?, ?, ?, ?)",
+                [(job.symbol, job.statement, period_type, csv, worker_id, now)
+                 for period_type, csv in (results or {}).items()])
+            if competitors:
+                self._add_competitors(conn, job.symbol, competitors)
+        return True
+
+    def release(self, job, error=None):
+        """
+        Gives a job back to the queue after a failed attempt.
+
+        Parameters
+        ----------
+        job : crawl_job
+                The job returned by lease()
+        error : str, optional
+                Why the attempt failed, kept as the last error of the job
+        """
+        status = 'failed' if job.token >= self.max_attempts else 'pending'
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE crawl_jobs SET status = ?, worker = NULL, lease_expires = NULL, last_error = ? "
+                "WHERE id = ? AND attempts = ? AND status = 'leased'",
+                (status, error, job.id, job.token))
+
+    def counts(self):
+        """
+        Returns the number of jobs per status.
+
+        Returns
+        -------
+        dict
+                pending, leased, done and failed job counts
+        """
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        # A read only query, no need to take the write lock workers lease jobs with
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            for status, count in conn.execute("SELECT status, COUNT(*) FROM crawl_jobs GROUP BY status"):
+                counts[status] = count
+        finally:
+            conn.close()
+        return counts
+
+    def failed_jobs(self):
+        """
+        Returns the jobs marked as failed with the error of their last attempt.
+
+        Returns
+        -------
+        list
+                [symbol, statement, attempts, last error] of each failed job
+        """
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            return [list(row) for row in conn.execute(
+                "SELECT symbol, statement, attempts, last_error FROM crawl_jobs "
+                "WHERE status = 'failed' ORDER BY id")]
+        finally:
+            conn.close()
+
+    def export(self, data_dir="."):
+        """
+        Writes the results as csv files into the dow_jones_stocks / all_competitors layout.
+
+        Each result is written to <source>/<symbol>/ and, for competitors, also to
+        dow_jones_stocks/<ticker>/competitors/<symbol>/ of every ticker it competes with.
+
+        Parameters
+        ----------
+        data_dir : str, optional
+                Directory where the project lives
+        """
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            rows = conn.execute(
+                "SELECT j.source, r.symbol, r.statement, r.period_type, r.csv FROM crawl_results r "
+                "JOIN crawl_jobs j ON j.symbol = r.symbol AND j.statement = r.statement")
+            for source, symbol, statement, period_type, csv in rows:
+                _write_csv(path.join(data_dir, source, symbol), symbol, statement, period_type, csv)
+
+            rows = conn.execute(
+                "SELECT p.ticker, r.symbol, r.statement, r.period_type, r.csv FROM crawl_peers p "
+                "JOIN crawl_results r ON r.symbol = p.competitor")
+            for ticker, symbol, statement, period_type, csv in rows:
+                _write_csv(path.join(data_dir, "dow_jones_stocks", ticker, "competitors", symbol),
+                           symbol, statement, period_type, csv)
+        finally:
+            conn.close()
+
+
+def _write_csv(my_path, symbol, statement, period_type, csv):
+    os.makedirs(my_path, exist_ok=True)
+    file_path = path.join(my_path, f"{symbol}{period_type}{statement}.csv")
+    # Leave unchanged files alone so peer_group_views.refresh() skips their groups
+    if path.isfile(file_path):
+        with open(file_path, newline="") as f:
+            if f.read() == csv:
+                return
+    with open(file_path, "w", newline="") as f:
+        f.write(csv)
+
+
+def _keep_alive(queue, job, stop):
+    """
+    Sends heartbeats for a job until stop is set or the lease is lost.
+    """
+    while not stop.wait(queue.lease_seconds / 3):
+        try:
+            if not queue.heartbeat(job):
+                return
+        except (OSError, RuntimeError):
+            # The coordinator could not be reached or failed to answer (e.g. database
+            # is locked), try again before the lease expires
+            continue
+
+
+def run_worker(queue, scrape, worker_id, poll_seconds=5):
+    """
+    Leases jobs from the queue and scrapes them until no job is left.
+
+    Parameters
+    ----------
+    queue : crawl_queue
+            The shared queue
+    scrape : function
+            Called with a crawl_job. Returns a dict of csv text keyed by period type
+            for a statement job and a list of competitors for a competitors job.
+            Any exception gives the job back to the queue.
+    worker_id : str
+            Name of the worker, e.g. host name and process id
+    poll_seconds : float, optional
+            How long to wait before asking again while other workers still hold leases
+
+    Returns
+    -------
+    int
+            The number of jobs completed by this worker
+    """
+    completed = 0
+    while True:
+        job = queue.lease(worker_id)
+        if job is None:
+            # Leases held by other workers may still expire or add competitor jobs
+            if queue.counts()['leased'] == 0:
+                return completed
+            time.sleep(poll_seconds)
+            continue
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_keep_alive, args=(queue, job, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result = scrape(job)
+        except Exception as e:
+            # Kept in the queue so failed jobs show why, e.g. a changed page layout
+            queue.release(job, repr(e))
+            continue
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if job.statement == "competitors":
+            done = queue.complete(job, worker_id, competitors=result)
+        else:
+            done = queue.complete(job, worker_id, results=result)
+        if done:
+            completed += 1
+
+
+# Methods of crawl_queue a crawl_queue_client may call on the coordinator
+REMOTE_METHODS = ['enqueue', 'add_competitors', 'lease', 'heartbeat', 'complete', 'release', 'counts',
+                  'failed_jobs']
+
+
+def crawl_server(queue, host="0.0.0.0", port=8765):
+    """
+    Returns a TCP server that shares the queue with crawl_queue_client nodes.
+
+    Each connection carries one request, a line of JSON with the method name and its
+    arguments, answered with a line of JSON holding the result or the error. Every
+    lease, heartbeat and expiry is stamped with the clock of this host. Requests are
+    not authenticated, only listen on a network the scraper nodes are trusted on.
+
+    Parameters
+    ----------
+    queue : crawl_queue
+            The queue stored on this host
+    host : str, optional
+            The address to listen on
+    port : int, optional
+            The port to listen on, 0 picks a free one
+
+    Returns
+    -------
+    socketserver.ThreadingTCPServer
+            Call serve_forever() to start answering requests
+    """
+    class handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                request = json.loads(self.rfile.readline())
+                method = request['method']
+                args = request['args']
+                if method == 'lease_seconds':
+                    response = {'result': queue.lease_seconds}
+                elif method in REMOTE_METHODS:
+                    if method in ('heartbeat', 'complete', 'release'):
+                        args[0] = crawl_job(*args[0])
+                    response = {'result': getattr(queue, method)(*args)}
+                else:
+                    response = {'error': f"unknown method {method}"}
+            except Exception as e:
+                response = {'error': repr(e)}
+            try:
+                self.wfile.write((json.dumps(response) + "\n").encode())
+            except OSError:
+                # The client is already gone, e.g. a port probe
+                pass
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class crawl_queue_client:
+    """
+    A crawl_queue on another host, reached through crawl_server().
+
+    ...
+
+    Has the same enqueue(), add_competitors(), lease(), heartbeat(), complete(),
+    release(), counts() and failed_jobs() methods as crawl_queue, so it can be passed to run_worker().
+
+    Attributes
+    ----------
+    address : tuple
+            (host, port) of the coordinator
+    lease_seconds : float
+            How long a lease lasts without a heartbeat, as set on the coordinator
+    """
+
+    def __init__(self, address, timeout=60):
+        """
+        Connects to the coordinator and reads its lease duration.
+
+        Parameters
+        ----------
+        address : str
+                host:port of the coordinator
+        timeout : float, optional
+                Seconds to wait for an answer of the coordinator
+        """
+        host, port = address.rsplit(":", 1)
+        self.address = (host, int(port))
+        self.timeout = timeout
+        self.lease_seconds = self._call('lease_seconds')
+
+    def _call(self, method, *args):
+        with socket.create_connection(self.address, timeout=self.timeout) as conn:
+            conn.sendall((json.dumps({'method': method, 'args': list(args)}) + "\n").encode())
+            response = json.loads(conn.makefile('rb').readline())
+        if 'error' in response:
+            raise RuntimeError(f"crawl coordinator: {response['error']}")
+        return response['result']
+
+    def enqueue(self, symbols, source="dow_jones_stocks", competitors=True):
+        self._call('enqueue', list(symbols), source, competitors)
+
+    def add_competitors(self, ticker, competitors):
+        self._call('add_competitors', ticker, list(competitors))
+
+    def lease(self, worker_id):
+        job = self._call('lease', worker_id)
+        return crawl_job(*job) if job is not None else None
+
+    def heartbeat(self, job):
+        return self._call('heartbeat', list(job))
+
+    def complete(self, job, worker_id, results=None, competitors=None):
+        return self._call('complete', list(job), worker_id, results, competitors)
+
+    def release(self, job, error=None):
+        self._call('release', list(job), error)
+
+    def counts(self):
+        return self._call('counts')
+
+    def failed_jobs(self):
+        return self._call('failed_jobs')
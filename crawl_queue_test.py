@@ -0,0 +1,166 @@
+import multiprocessing
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from os import path
+from crawl_queue import crawl_queue, crawl_queue_client, crawl_server, run_worker
+from statement_reader import PERIOD_TYPES, iter_statements
+
+# Checks the crawl queue with several processes acting as scraper nodes on this host,
+# without Chrome: one node dies while holding a lease, and the first attempt of every
+# D2 job fails. Run with pytest or with python crawl_queue_test.py
+
+LEASE_SECONDS = 1
+DOW_JONES = ['D1', 'D2', 'D3']
+
+
+def _scrape(job):
+    if job.symbol == "D2" and job.token == 1:
+        raise ValueError("injected failure")
+    time.sleep(0.05)
+    if job.statement == "competitors":
+        return ["P" + job.symbol, "D1", "X.XE"]
+    return {period_type: f'items,2022,ticker\nTotal Revenue,"1,000",{job.symbol}\n' for period_type in PERIOD_TYPES}
+
+
+def _die(job):
+    # Killed in the middle of a job, the lease is never completed nor released
+    os._exit(1)
+
+
+def _node(db_path, address, die=False):
+    if address is not None:
+        queue = crawl_queue_client(address)
+    else:
+        queue = crawl_queue(db_path, lease_seconds=LEASE_SECONDS)
+    run_worker(queue, _die if die else _scrape, f"node-{os.getpid()}", poll_seconds=0.1)
+
+
+def _crawl(db_path, address=None, nodes=4):
+    """
+    Seeds the queue, kills one node mid-job and drains the queue with the other nodes.
+    """
+    context = multiprocessing.get_context("spawn")
+    if address is not None:
+        queue = crawl_queue_client(address)
+    else:
+        queue = crawl_queue(db_path, lease_seconds=LEASE_SECONDS)
+    queue.enqueue(DOW_JONES)
+
+    dead = context.Process(target=_node, args=(db_path, address, True))
+    dead.start()
+    dead.join()
+    assert dead.exitcode == 1
+
+    workers = [context.Process(target=_node, args=(db_path, address)) for i in range(nodes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+
+def _check(db_path, data_dir):
+    queue = crawl_queue(db_path, lease_seconds=LEASE_SECONDS)
+    # 3 Dow Jones stocks with 4 jobs each, 3 competitors with 3 jobs each
+    assert queue.counts() == {'pending': 0, 'leased': 0, 'done': 21, 'failed': 0}
+
+    conn = sqlite3.connect(db_path)
+    try:
+        attempts = dict(conn.execute("SELECT symbol || ' ' || statement, attempts FROM crawl_jobs"))
+    finally:
+        conn.close()
+    # The job of the dead node was leased again once its lease expired
+    assert attempts["D1 balance-sheet"] == 2
+    # Failed attempts were given back to the queue and retried
+    assert all(attempts[f"D2 {statement}"] == 2
+               for statement in ['balance-sheet', 'income-statement', 'cash-flow', 'competitors'])
+
+    queue.export(data_dir)
+    for source, symbols in [('dow_jones_stocks', DOW_JONES), ('all_competitors', ['PD1', 'PD2', 'PD3'])]:
+        for symbol in symbols:
+            symbol_dir = path.join(data_dir, source, symbol)
+            assert sum(1 for i in os.listdir(symbol_dir) if path.isfile(path.join(symbol_dir, i))) == 6
+    # D1 is a competitor of D2 and D3 but scraped only once, X.XE is not on TD Ameritrade
+    assert sorted(os.listdir(path.join(data_dir, 'dow_jones_stocks', 'D2', 'competitors'))) == ['D1', 'PD2']
+    assert not path.exists(path.join(data_dir, 'all_competitors', 'D1'))
+    assert not path.exists(path.join(data_dir, 'all_competitors', 'X.XE'))
+    assert sum(1 for i in iter_statements(data_dir=data_dir)) == 6 * 3 * 2
+
+
+def test_lease_fencing():
+    with tempfile.TemporaryDirectory() as data_dir:
+        queue = crawl_queue(path.join(data_dir, "crawl_queue.db"), lease_seconds=0.2)
+        queue.enqueue(['D1'], competitors=False)
+
+        first = queue.lease("first")
+        assert queue.heartbeat(first)
+        time.sleep(0.3)
+        second = queue.lease("second")
+        assert (second.id, second.token) == (first.id, 2)
+
+        # The first worker lost its lease, its heartbeats and results are rejected
+        assert not queue.heartbeat(first)
+        assert not queue.complete(first, "first", results={'annual': "first"})
+        assert queue.complete(second, "second", results={'annual': "second"})
+        assert queue.counts()['done'] == 1
+
+
+def test_failed_jobs_keep_their_error():
+    with tempfile.TemporaryDirectory() as data_dir:
+        queue = crawl_queue(path.join(data_dir, "crawl_queue.db"), lease_seconds=LEASE_SECONDS, max_attempts=2)
+        queue.enqueue(['D1'], competitors=False)
+
+        def scrape(job):
+            raise ValueError(f"no table for {job.symbol}")
+
+        assert run_worker(queue, scrape, "node", poll_seconds=0.1) == 0
+        assert queue.counts()['failed'] == 3
+        assert queue.failed_jobs()[0] == ['D1', 'balance-sheet', 2, "ValueError('no table for D1')"]
+
+
+def test_coordinator_answers_malformed_requests():
+    with tempfile.TemporaryDirectory() as data_dir:
+        server = crawl_server(crawl_queue(path.join(data_dir, "crawl_queue.db")), "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            for request in [b"\n", b"not json\n", b'{"args": []}\n', b'{"method": "drop", "args": []}\n']:
+                with socket.create_connection(server.server_address, timeout=5) as conn:
+                    conn.sendall(request)
+                    assert 'error' in json.loads(conn.makefile('rb').readline())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def test_workers_sharing_queue_file():
+    with tempfile.TemporaryDirectory() as data_dir:
+        db_path = path.join(data_dir, "crawl_queue.db")
+        _crawl(db_path)
+        _check(db_path, data_dir)
+
+
+def test_workers_through_coordinator():
+    with tempfile.TemporaryDirectory() as data_dir:
+        db_path = path.join(data_dir, "crawl_queue.db")
+        server = crawl_server(crawl_queue(db_path, lease_seconds=LEASE_SECONDS), "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            _crawl(None, f"127.0.0.1:{server.server_address[1]}")
+        finally:
+            server.shutdown()
+            server.server_close()
+        _check(db_path, data_dir)
+
+
+if __name__ == "__main__":
+    test_lease_fencing()
+    test_failed_jobs_keep_their_error()
+    test_coordinator_answers_malformed_requests()
+    test_workers_sharing_queue_file()
+    test_workers_through_coordinator()
+    print("crawl queue ok")
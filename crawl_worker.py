@@ -0,0 +1,78 @@
+import argparse
+import os
+import socket
+from crawl_queue import crawl_queue, crawl_queue_client, crawl_server, run_worker
+from peer_views import peer_group_views
+from td_ameritrade_scrape import td_ameritrade_scrape
+from config import directory
+
+# Runs one node of a multi-node crawl.
+#
+# On one host every node points at the same queue file:
+#
+#   python crawl_worker.py seed      # once, adds the Dow Jones jobs
+#   python crawl_worker.py work      # as many times as Chrome allows
+#   python crawl_worker.py status
+#   python crawl_worker.py export    # once the queue is drained, writes the csv files and peer views
+#
+# Across machines one coordinator keeps the queue file and the other nodes connect to it:
+#
+#   python crawl_worker.py serve                              # on the coordinator
+#   python crawl_worker.py seed --coordinator HOST:8765       # anywhere, once
+#   python crawl_worker.py work --coordinator HOST:8765       # on every node
+#   python crawl_worker.py export                             # on the coordinator
+
+parser = argparse.ArgumentParser(description="Scrape TD Ameritrade from a shared crawl queue.")
+parser.add_argument("command", choices=["seed", "work", "status", "export", "serve"])
+parser.add_argument("--queue", default=os.path.join(directory, "crawl_queue.db"),
+                    help="path to the SQLite queue file, on a local disk of this host")
+parser.add_argument("--coordinator", help="host:port of a node running serve, instead of --queue")
+parser.add_argument("--port", type=int, default=8765, help="port serve listens on")
+parser.add_argument("--lease-seconds", type=float, default=120)
+parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+args = parser.parse_args()
+
+if args.coordinator is not None:
+    if args.command in ("export", "serve"):
+        parser.error(f"{args.command} runs on the coordinator, next to the queue file")
+    queue = crawl_queue_client(args.coordinator)
+else:
+    queue = crawl_queue(args.queue, lease_seconds=args.lease_seconds)
+
+if args.command == "status":
+    print(queue.counts())
+    for symbol, statement, attempts, last_error in queue.failed_jobs():
+        print(f"failed {symbol} {statement} after {attempts} attempts: {last_error}")
+
+elif args.command == "serve":
+    server = crawl_server(queue, port=args.port)
+    print(f"Serving {args.queue} on port {args.port}")
+    server.serve_forever()
+
+elif args.command == "export":
+    queue.export(directory)
+    peer_group_views(directory).refresh()
+
+elif args.command == "seed":
+    queue.enqueue(td_ameritrade_scrape.dow_jones_symbols())
+    print(queue.counts())
+
+else:
+    # Initializes the class and opens the web browser
+    scraper = td_ameritrade_scrape()
+
+    def scrape(job):
+        if job.statement == "competitors":
+            scraper.set_url(f"https://www.wsj.com/market-data/quotes/{job.symbol}")
+            scraper.get_url()
+            return scraper.competitor_symbols()
+
+        frames = scraper.get_statement(job.symbol, job.statement)
+        return {period_type: df.to_csv(index=False) for period_type, df in frames.items()}
+
+    # Closes the browser even when the coordinator is unreachable or the worker is interrupted
+    try:
+        completed = run_worker(queue, scrape, args.worker_id)
+        print(f"{args.worker_id} completed {completed} jobs")
+    finally:
+        scraper.close_browser()
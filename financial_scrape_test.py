@@ -1,6 +1,7 @@
 import os
 from td_ameritrade_scrape import *
 from config import directory
+from peer_views import peer_group_views
 
 # Directory where your project lives
 my_directory = directory
@@ -91,3 +92,6 @@ for ticker in dow_jones_list:
 
 
 scraper.close_browser()
+
+# Recomputes the peer group aggregates of the stocks whose csv files changed
+peer_group_views(my_directory).refresh()
@@ -0,0 +1,358 @@
+# Import Dependencies
+import os
+import sqlite3
+import statistics
+from collections import namedtuple
+from os import path
+from statement_reader import DATA_SOURCES, iter_statements, statement_files
+
+# Ratios of ratio_analysis.ipynb: name -> (numerator, denominator) as (statement, item)
+RATIOS = {
+    'Debt-to-Equity Ratio': (('balance-sheet', 'Total Liabilities'), ('balance-sheet', 'Total Equity')),
+    'Current Ratio': (('balance-sheet', 'Total Current Assets'), ('balance-sheet', 'Total Current Liabilities')),
+    'Quick Ratio': (('balance-sheet', 'Total Current Assets'), ('balance-sheet', 'Total Inventory')),
+    'Interest Coverage Ratio': (('income-statement', 'Total Operating Income'), ('income-statement', 'Interest Expense, Suppl')),
+    'Operating Margin': (('income-statement', 'Total Operating Income'), ('income-statement', 'Total Revenue')),
+    'Net Income Margin': (('income-statement', 'Total Net Income'), ('income-statement', 'Total Revenue')),
+    'Accounts Receivable Turnover': (('income-statement', 'Total Revenue'), ('balance-sheet', 'Total Receivables, Net')),
+    'Inventory Turnover Ratio': (('income-statement', 'Cost of Revenue, Total'), ('balance-sheet', 'Total Inventory')),
+    'Return on Assets': (('income-statement', 'Income After Tax'), ('balance-sheet', 'Total Assets')),
+    'Return on Equity': (('income-statement', 'Income After Tax'), ('balance-sheet', 'Total Equity')),
+}
+
+peer_aggregate = namedtuple(
+    'peer_aggregate',
+    ['ticker', 'statement', 'period_type', 'item', 'period',
+     'members', 'value', 'median', 'mean', 'percentile_rank', 'z_score'])
+peer_aggregate.__doc__ = """
+    A line item or ratio of a Dow Jones stock compared against its peer group for one period.
+
+    Attributes
+    ----------
+    ticker : str
+            The Dow Jones stock the peer group belongs to
+    statement : str
+            The report of the line item, or ratio for the ratios in RATIOS
+    period_type : str
+            Either annual or quarterly
+    item : str
+            The line item or ratio name, followed by #2 for the second row of an item
+            a report lists twice
+    period : str
+            The column header of the report (e.g. 2022 or Q4 2022)
+    members : int
+            How many stocks of the peer group (the Dow Jones stock included) report a value
+    value : float or None
+            The value of the Dow Jones stock
+    median : float
+            The median of the peer group
+    mean : float
+            The mean of the peer group
+    percentile_rank : float or None
+            Percentage of the peer group below the Dow Jones stock, ties counting half
+    z_score : float or None
+            Standard deviations between the Dow Jones stock and the peer group mean
+    """
+
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS peer_aggregates (
+    ticker TEXT NOT NULL,
+    statement TEXT NOT NULL,
+    period_type TEXT NOT NULL,
+    item TEXT NOT NULL,
+    period TEXT NOT NULL,
+    period_key INTEGER,
+    members INTEGER NOT NULL,
+    value REAL,
+    median REAL NOT NULL,
+    mean REAL NOT NULL,
+    percentile_rank REAL,
+    z_score REAL,
+    PRIMARY KEY (ticker, item, period_type, period, statement)
+);
+CREATE TABLE IF NOT EXISTS peer_members (
+    ticker TEXT NOT NULL,
+    member TEXT NOT NULL,
+    PRIMARY KEY (ticker, member)
+);
+CREATE INDEX IF NOT EXISTS peer_members_member ON peer_members (member);
+CREATE TABLE IF NOT EXISTS peer_sources (
+    symbol TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (symbol, file_path)
+);
+"""
+
+
+def peer_groups(data_dir="."):
+    """
+    Returns the peer group of every Dow Jones stock found in dow_jones_stocks.
+
+    Parameters
+    ----------
+    data_dir : str, optional
+            Directory where the project lives
+
+    Returns
+    -------
+    dict
+            The members of each peer group keyed by Dow Jones stock, the stock itself first
+    """
+    dow_jones_dir = path.join(data_dir, "dow_jones_stocks")
+    groups = {}
+    if not path.isdir(dow_jones_dir):
+        return groups
+    for ticker in sorted(os.listdir(dow_jones_dir)):
+        competitor_dir = path.join(dow_jones_dir, ticker, "competitors")
+        if not path.isdir(path.join(dow_jones_dir, ticker)):
+            continue
+        competitors = []
+        if path.isdir(competitor_dir):
+            competitors = sorted(i for i in os.listdir(competitor_dir)
+                                 if path.isdir(path.join(competitor_dir, i)) and i != ticker)
+        groups[ticker] = [ticker] + competitors
+    return groups
+
+
+def _period_key(period):
+    """
+    Returns year * 10 + quarter of a column header so periods sort in time order.
+
+    Annual headers (e.g. 2022) get quarter 0, quarterly ones (e.g. Q4 2022) their quarter.
+    None for a header that is neither.
+    """
+    parts = period.split()
+    try:
+        if len(parts) == 2 and parts[0].startswith("Q"):
+            return int(parts[1]) * 10 + int(parts[0][1:])
+        return int(period) * 10
+    except ValueError:
+        return None
+
+
+def _aggregate(dow_value, values):
+    """
+    Returns median, mean, percentile rank and z-score of the Dow Jones stock within values.
+    """
+    median = statistics.median(values)
+    mean = statistics.fmean(values)
+    if dow_value is None:
+        return median, mean, None, None
+    below = sum(1 for i in values if i < dow_value)
+    equal = sum(1 for i in values if i == dow_value)
+    percentile_rank = 100 * (below + 0.5 * equal) / len(values)
+    stdev = statistics.pstdev(values, mean)
+    z_score = (dow_value - mean) / stdev if stdev > 0 else None
+    return median, mean, percentile_rank, z_score
+
+
+class peer_group_views:
+    """
+    Peer group aggregates of every line item and ratio, stored in a SQLite file for instant lookup.
+
+    ...
+
+    Each Dow Jones stock is compared against the competitors in dow_jones_stocks/<ticker>/competitors.
+    For every line item, ratio and period the median and mean of the group and the percentile
+    rank and z-score of the Dow Jones stock are stored. refresh() only recomputes the groups
+    whose membership changed or that contain a stock whose csv files changed since the last refresh.
+
+    Attributes
+    ----------
+    data_dir : str
+            Directory where the project lives
+    db_path : str
+            Path to the SQLite file
+
+    Methods
+    -------
+    refresh(symbols=None):
+        Recomputes the peer groups affected by changed csv files and returns their tickers.
+
+    lookup(ticker, item, period_type=None, period=None):
+        Returns the stored aggregates of a line item or ratio for one Dow Jones stock.
+    """
+
+    def __init__(self, data_dir=".", db_path=None):
+        """
+        Constructs the views and creates their tables if they do not exist.
+
+        Parameters
+        ----------
+        data_dir : str, optional
+                Directory where the project lives
+        db_path : str, optional
+                Path to the SQLite file, peer_views.db in data_dir by default
+        """
+        self.data_dir = data_dir
+        self.db_path = db_path if db_path is not None else path.join(data_dir, "peer_views.db")
+        conn = sqlite3.connect(self.db_path)
+        try:
+            # Views stored by an older version are dropped and rebuilt by the next refresh()
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript(
+                    "DROP TABLE IF EXISTS peer_aggregates; DROP TABLE IF EXISTS peer_members; "
+                    "DROP TABLE IF EXISTS peer_sources;")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _signatures(self, symbols):
+        """
+        Returns (symbol, file path) -> (mtime, size) of the csv files of symbols.
+        """
+        signatures = {}
+        for symbol, statement, period_type, file_path in statement_files(
+                symbols, data_dir=self.data_dir, sources=DATA_SOURCES):
+            stat = os.stat(file_path)
+            signatures[(symbol, path.relpath(file_path, self.data_dir))] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def refresh(self, symbols=None):
+        """
+        Recomputes the peer groups affected by changed csv files and returns their tickers.
+
+        Parameters
+        ----------
+        symbols : list, optional
+                Stocks whose statements were refreshed. Only their files are checked
+                for changes, all files are checked when None.
+
+        Returns
+        -------
+        list
+                The Dow Jones stocks whose peer group was recomputed
+        """
+        groups = peer_groups(self.data_dir)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            stored_members = {}
+            for ticker, member in conn.execute("SELECT ticker, member FROM peer_members"):
+                stored_members.setdefault(ticker, set()).add(member)
+
+            # Groups that appeared, disappeared or gained/lost members
+            dirty = {ticker for ticker in set(groups) | set(stored_members)
+                     if set(groups.get(ticker, [])) != stored_members.get(ticker, set())}
+
+            all_members = {member for members in groups.values() for member in members}
+            if symbols is None:
+                checked = all_members
+            else:
+                # Members of new or changed groups too, so their files are tracked from now on
+                checked = (set(symbols) & all_members).union(
+                    *[groups[ticker] for ticker in dirty if ticker in groups])
+
+            current = self._signatures(checked)
+            stored = {}
+            for symbol, file_path, mtime_ns, size in conn.execute(
+                    "SELECT symbol, file_path, mtime_ns, size FROM peer_sources"):
+                if symbol in checked:
+                    stored[(symbol, file_path)] = (mtime_ns, size)
+
+            changed = {key[0] for key in set(current) | set(stored) if current.get(key) != stored.get(key)}
+            dirty |= {ticker for ticker, members in groups.items() if changed.intersection(members)}
+
+            for ticker in sorted(dirty):
+                rows = self._compute(ticker, groups[ticker]) if ticker in groups else []
+                with conn:
+                    conn.execute("DELETE FROM peer_aggregates WHERE ticker = ?", (ticker,))
+                    conn.executemany(
+                        "INSERT INTO peer_aggregates (ticker, statement, period_type, item, period, period_key, "
+                        "members, value, median, mean, percentile_rank, z_score) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows)
+                    conn.execute("DELETE FROM peer_members WHERE ticker = ?", (ticker,))
+                    conn.executemany("INSERT INTO peer_members VALUES (?, ?)",
+                                     [(ticker, member) for member in groups.get(ticker, [])])
+
+            with conn:
+                conn.executemany(
+                    "DELETE FROM peer_sources WHERE symbol = ? AND file_path = ?",
+                    [key for key in stored if key not in current])
+                # Stocks that dropped out of every peer group
+                stale = [row for row in conn.execute("SELECT DISTINCT symbol FROM peer_sources")
+                         if row[0] not in all_members]
+                conn.executemany("DELETE FROM peer_sources WHERE symbol = ?", stale)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO peer_sources VALUES (?, ?, ?, ?)",
+                    [key + value for key, value in current.items() if stored.get(key) != value])
+        finally:
+            conn.close()
+        return sorted(dirty)
+
+    def _compute(self, ticker, members):
+        """
+        Returns the aggregate rows of one peer group, reading only the csv files of its members.
+        """
+        # (statement, period_type, item, period) -> {member: value}
+        values = {}
+        # (member, statement, period_type, item) -> csv rows of the item, in file order
+        lines = {}
+        for record in iter_statements(symbols=members, data_dir=self.data_dir):
+            # Some reports list an item twice (e.g. Policy Liabilities), the repeats are
+            # compared as "Policy Liabilities #2" so different rows are never mixed
+            item_lines = lines.setdefault((record.ticker, record.statement, record.period_type, record.item), [])
+            if record.line not in item_lines:
+                item_lines.append(record.line)
+            item = record.item if item_lines[0] == record.line else f"{record.item} #{item_lines.index(record.line) + 1}"
+
+            if record.value is not None:
+                key = (record.statement, record.period_type, item, record.period)
+                values.setdefault(key, {})[record.ticker] = record.value
+
+        for ratio, (numerator, denominator) in RATIOS.items():
+            for (statement, period_type, item, period), member_values in list(values.items()):
+                if (statement, item) != numerator:
+                    continue
+                denominators = values.get((denominator[0], period_type, denominator[1], period), {})
+                ratios = {member: value / denominators[member] for member, value in member_values.items()
+                          if denominators.get(member)}
+                if ratios:
+                    values[('ratio', period_type, ratio, period)] = ratios
+
+        rows = []
+        for (statement, period_type, item, period), member_values in values.items():
+            dow_value = member_values.get(ticker)
+            median, mean, percentile_rank, z_score = _aggregate(dow_value, list(member_values.values()))
+            rows.append((ticker, statement, period_type, item, period, _period_key(period), len(member_values),
+                         dow_value, median, mean, percentile_rank, z_score))
+        return rows
+
+    def lookup(self, ticker, item, period_type=None, period=None):
+        """
+        Returns the stored aggregates of a line item or ratio for one Dow Jones stock.
+
+        Parameters
+        ----------
+        ticker : str
+                The Dow Jones stock
+        item : str
+                The line item (e.g. Total Revenue) or ratio (e.g. Operating Margin)
+        period_type : str, optional
+                annual or quarterly, both when None
+        period : str, optional
+                The column header of the report (e.g. 2022 or Q4 2022), all when None
+
+        Returns
+        -------
+        list
+                peer_aggregate of each matching period, annual then quarterly, in time order
+        """
+        query = ("SELECT ticker, statement, period_type, item, period, members, value, median, mean, "
+                 "percentile_rank, z_score FROM peer_aggregates WHERE ticker = ? AND item = ?")
+        params = [ticker, item]
+        if period_type is not None:
+            query += " AND period_type = ?"
+            params.append(period_type)
+        if period is not None:
+            query += " AND period = ?"
+            params.append(period)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return [peer_aggregate(*row) for row in conn.execute(query + " ORDER BY period_type, period_key, period", params)]
+        finally:
+            conn.close()
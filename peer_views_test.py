@@ -0,0 +1,144 @@
+import csv
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+from os import path
+from peer_views import peer_group_views
+
+# Checks the peer group views on a small dow_jones_stocks / all_competitors tree:
+# AAA competes with BBB and CCC, DDD competes with BBB.
+# Run with pytest or with python peer_views_test.py
+
+ANNUAL = ['2021', '2022']
+# Written out of time order on purpose, lookup() has to sort them
+QUARTERLY = ['Q4 2022', 'Q1 2023', 'Q2 2023']
+
+
+def _write(my_path, symbol, period_type, statement, rows):
+    os.makedirs(my_path, exist_ok=True)
+    periods = ANNUAL if period_type == 'annual' else QUARTERLY
+    with open(path.join(my_path, f"{symbol}{period_type}{statement}.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(['items'] + periods + ['ticker'])
+        for item, value in rows:
+            writer.writerow([item] + [f"{value:,}"] * len(periods) + [symbol])
+
+
+def _stock(data_dir, source, symbol, revenue, operating_income, income_after_tax, total_assets=None):
+    my_path = path.join(data_dir, source, symbol)
+    for period_type in ['annual', 'quarterly']:
+        income = [('Total Revenue', revenue), ('Total Operating Income', operating_income),
+                  ('Income After Tax', income_after_tax), ('Other, Net', 1), ('Other, Net', 2)]
+        _write(my_path, symbol, period_type, 'income-statement', income)
+        if total_assets is not None:
+            _write(my_path, symbol, period_type, 'balance-sheet', [('Total Assets', total_assets)])
+
+
+def _tree(data_dir):
+    _stock(data_dir, 'dow_jones_stocks', 'AAA', 30, 15, 6, total_assets=60)
+    _stock(data_dir, 'dow_jones_stocks', 'DDD', 40, 4, 4)
+    _stock(data_dir, 'all_competitors', 'BBB', 10, 1, 2, total_assets=40)
+    _stock(data_dir, 'all_competitors', 'CCC', 20, 10, 2)
+    for ticker, competitor in [('AAA', 'BBB'), ('AAA', 'CCC'), ('DDD', 'BBB')]:
+        os.makedirs(path.join(data_dir, 'dow_jones_stocks', ticker, 'competitors', competitor))
+
+
+def _touch(data_dir, source, symbol):
+    file_path = path.join(data_dir, source, symbol, f"{symbol}annualincome-statement.csv")
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_aggregates():
+    with tempfile.TemporaryDirectory() as data_dir:
+        _tree(data_dir)
+        views = peer_group_views(data_dir)
+        views.refresh()
+
+        revenue = views.lookup('AAA', 'Total Revenue', 'annual', '2022')[0]
+        assert (revenue.members, revenue.value, revenue.median, revenue.mean) == (3, 30, 20, 20)
+        assert math.isclose(revenue.percentile_rank, 100 * 2.5 / 3)
+        assert math.isclose(revenue.z_score, 10 / math.sqrt(200 / 3))
+
+        # Ratio of one statement: 15 / 30, 1 / 10, 10 / 20
+        margin = views.lookup('AAA', 'Operating Margin', 'annual', '2022')[0]
+        assert (margin.statement, margin.members, margin.value, margin.median) == ('ratio', 3, 0.5, 0.5)
+        # Ratio across statements, only AAA and BBB report Total Assets: 6 / 60, 2 / 40
+        roa = views.lookup('AAA', 'Return on Assets', 'annual', '2022')[0]
+        assert (roa.members, roa.value) == (2, 0.1)
+        assert math.isclose(roa.mean, 0.075)
+
+        # The two Other, Net rows are never mixed
+        assert views.lookup('AAA', 'Other, Net', 'annual', '2022')[0].value == 1
+        assert views.lookup('AAA', 'Other, Net #2', 'annual', '2022')[0].value == 2
+
+
+def test_lookup_time_order():
+    with tempfile.TemporaryDirectory() as data_dir:
+        _tree(data_dir)
+        views = peer_group_views(data_dir)
+        views.refresh()
+        assert [i.period for i in views.lookup('AAA', 'Total Revenue')] == \
+            ['2021', '2022', 'Q4 2022', 'Q1 2023', 'Q2 2023']
+
+
+def test_refresh_changed_files():
+    with tempfile.TemporaryDirectory() as data_dir:
+        _tree(data_dir)
+        views = peer_group_views(data_dir)
+        assert views.refresh() == ['AAA', 'DDD']
+        assert views.refresh() == []
+
+        # Only the groups containing the touched stock are recomputed
+        _touch(data_dir, 'all_competitors', 'CCC')
+        assert views.refresh() == ['AAA']
+        _touch(data_dir, 'all_competitors', 'BBB')
+        assert views.refresh() == ['AAA', 'DDD']
+
+        # symbols= only checks the files of those stocks
+        _touch(data_dir, 'all_competitors', 'BBB')
+        _touch(data_dir, 'dow_jones_stocks', 'DDD')
+        assert views.refresh(symbols=['DDD']) == ['DDD']
+        assert views.refresh() == ['AAA', 'DDD']
+        assert views.refresh() == []
+
+
+def test_refresh_membership_changes():
+    with tempfile.TemporaryDirectory() as data_dir:
+        _tree(data_dir)
+        views = peer_group_views(data_dir, db_path=path.join(data_dir, "views.db"))
+        views.refresh()
+
+        competitors = path.join(data_dir, 'dow_jones_stocks', 'DDD', 'competitors')
+        os.makedirs(path.join(competitors, 'CCC'))
+        assert views.refresh() == ['DDD']
+        assert views.lookup('DDD', 'Total Revenue', 'annual', '2022')[0].members == 3
+
+        os.rmdir(path.join(competitors, 'CCC'))
+        assert views.refresh() == ['DDD']
+        assert views.lookup('DDD', 'Total Revenue', 'annual', '2022')[0].members == 2
+
+        # CCC leaves its only group, its file signatures are no longer kept
+        os.rmdir(path.join(data_dir, 'dow_jones_stocks', 'AAA', 'competitors', 'CCC'))
+        assert views.refresh() == ['AAA']
+        conn = sqlite3.connect(views.db_path)
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM peer_sources WHERE symbol = 'CCC'").fetchone()[0] == 0
+        finally:
+            conn.close()
+
+        # A removed Dow Jones stock loses its views
+        shutil.rmtree(path.join(data_dir, 'dow_jones_stocks', 'DDD'))
+        assert views.refresh() == ['DDD']
+        assert views.lookup('DDD', 'Total Revenue') == []
+        assert views.refresh() == []
+
+
+if __name__ == "__main__":
+    test_aggregates()
+    test_lookup_time_order()
+    test_refresh_changed_files()
+    test_refresh_membership_changes()
+    print("peer views ok")
@@ -0,0 +1,224 @@
+# Import Dependencies
+import csv
+import os
+from collections import namedtuple
+
+# Layout written by td_ameritrade_scrape.get_data() and get_competitor_data()
+DATA_SOURCES = ['dow_jones_stocks', 'all_competitors']
+STATEMENTS = ['balance-sheet', 'income-statement', 'cash-flow']
+PERIOD_TYPES = ['annual', 'quarterly']
+
+statement_record = namedtuple(
+    'statement_record',
+    ['ticker', 'statement', 'period_type', 'item', 'line', 'period', 'value'])
+statement_record.__doc__ = """
+    A single value of a scraped financial statement.
+
+    Attributes
+    ----------
+    ticker : str
+            The stock ticker the value belongs to
+    statement : str
+            The report (balance-sheet, income-statement, cash-flow)
+    period_type : str
+            Either annual or quarterly
+    item : str
+            The line item of the report (e.g. Total Revenue)
+    line : int
+            The 0-based index of the row in the csv. Some reports list the same item
+            twice (e.g. Policy Liabilities, Other, Net), line tells those rows apart.
+    period : str
+            The column header of the report (e.g. 2022 or Q4 2022)
+    value : float or None
+            The reported value, None when TD Ameritrade shows no data
+    """
+
+
+def _as_set(value):
+    """
+    Returns None for None, a one element set for a str and a set otherwise.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return {value}
+    return set(value)
+
+
+def parse_value(text):
+    """
+    Converts a value as shown on TD Ameritrade into a number.
+
+    Parameters
+    ----------
+    text : str
+            The value of a cell, e.g. "11,575", "(3,240)" or "--"
+
+    Returns
+    -------
+    float or None
+            The number, negative when written in parentheses and None when there is no data
+    """
+    text = text.strip().replace(",", "")
+    if text in ("", "--"):
+        return None
+    if text.startswith("(") and text.endswith(")"):
+        text = "-" + text[1:-1]
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def statement_files(symbols=None, statements=None, period_type=None, data_dir=".", sources=DATA_SOURCES):
+    """
+    Yields the csv files of the scraped data without opening them.
+
+    Symbols, statements and period types are filtered on the directory and
+    file names so files that are not asked for are never read. The copies kept in
+    dow_jones_stocks/<ticker>/competitors are skipped, and a symbol found in more
+    than one source is only yielded from the first one.
+
+    Parameters
+    ----------
+    symbols : str or iterable of str, optional
+            The stock tickers to read, all when None
+    statements : str or iterable of str, optional
+            The reports to read (balance-sheet, income-statement, cash-flow), all when None
+    period_type : str or iterable of str, optional
+            annual and/or quarterly, both when None
+    data_dir : str, optional
+            Directory where the project lives
+    sources : list, optional
+            Subdirectories of data_dir holding one directory per ticker
+
+    Yields
+    ------
+    tuple
+            (ticker, statement, period_type, file path)
+    """
+    symbols = _as_set(symbols)
+    statements = [i for i in STATEMENTS if statements is None or i in _as_set(statements)]
+    period_types = [i for i in PERIOD_TYPES if period_type is None or i in _as_set(period_type)]
+
+    seen = set()
+    for source in sources:
+        source_dir = os.path.join(data_dir, source)
+        if not os.path.isdir(source_dir):
+            continue
+        if symbols is None:
+            tickers = sorted(os.listdir(source_dir))
+        else:
+            tickers = sorted(symbols)
+
+        for ticker in tickers:
+            ticker_dir = os.path.join(source_dir, ticker)
+            if ticker in seen or not os.path.isdir(ticker_dir):
+                continue
+            seen.add(ticker)
+
+            for statement in statements:
+                for period in period_types:
+                    file_path = os.path.join(
+                        ticker_dir, f"{ticker}{period}{statement}.csv")
+                    if os.path.isfile(file_path):
+                        yield ticker, statement, period, file_path
+
+
+def iter_statements(symbols=None, statements=None, period_type=None, items=None, data_dir=".", sources=DATA_SOURCES):
+    """
+    Lazily yields every value of the scraped statements one record at a time.
+
+    Only one csv row is held in memory at once, so any number of tickers can be
+    read in bounded memory. Rows whose line item is not asked for are skipped
+    before their values are parsed.
+
+    Parameters
+    ----------
+    symbols : str or iterable of str, optional
+            The stock tickers to read, all when None
+    statements : str or iterable of str, optional
+            The reports to read (balance-sheet, income-statement, cash-flow), all when None
+    period_type : str or iterable of str, optional
+            annual and/or quarterly, both when None
+    items : str or iterable of str, optional
+            The line items to read (e.g. Total Revenue), all when None
+    data_dir : str, optional
+            Directory where the project lives
+    sources : list, optional
+            Subdirectories of data_dir holding one directory per ticker
+
+    Yields
+    ------
+    statement_record
+            One value of one line item for one period
+    """
+    items = _as_set(items)
+
+    for ticker, statement, period, file_path in statement_files(
+            symbols, statements, period_type, data_dir, sources):
+        with open(file_path, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                continue
+            # Columns are: items, <periods...>, ticker
+            periods = header[1:-1]
+
+            for line, row in enumerate(reader):
+                if not row or (items is not None and row[0] not in items):
+                    continue
+                for column, value in zip(periods, row[1:-1]):
+                    yield statement_record(ticker, statement, period, row[0], line, column, parse_value(value))
+
+
+def iter_statement_batches(symbols=None, statements=None, period_type=None, items=None, data_dir=".",
+                           sources=DATA_SOURCES, batch_size=10000, output="records"):
+    """
+    Lazily yields the records of iter_statements() in batches of at most batch_size.
+
+    Parameters
+    ----------
+    symbols, statements, period_type, items, data_dir, sources :
+            See iter_statements()
+    batch_size : int, optional
+            The maximum number of records per batch
+    output : str, optional
+            records for a list of statement_record, pandas for a DataFrame
+            or arrow for a pyarrow Table (requires pyarrow to be installed)
+
+    Yields
+    ------
+    list, DataFrame or pyarrow.Table
+            One batch of records
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    if output == "records":
+        def convert(batch):
+            return batch
+    elif output == "pandas":
+        import pandas as pd
+
+        def convert(batch):
+            return pd.DataFrame.from_records(batch, columns=statement_record._fields)
+    elif output == "arrow":
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("output='arrow' requires pyarrow, install it with 'pip install pyarrow'")
+
+        def convert(batch):
+            return pa.Table.from_pydict(
+                {field: [getattr(record, field) for record in batch] for field in statement_record._fields})
+    else:
+        raise ValueError("output must be one of 'records', 'pandas' or 'arrow'")
+
+    batch = []
+    for record in iter_statements(symbols, statements, period_type, items, data_dir, sources):
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield convert(batch)
+            batch = []
+    if batch:
+        yield convert(batch)
@@ -0,0 +1,102 @@
+import csv
+import os
+import tempfile
+from os import path
+from statement_reader import iter_statement_batches, iter_statements, parse_value
+
+# Checks the streaming reader on a small dow_jones_stocks / all_competitors tree.
+# Run with pytest or with python statement_reader_test.py
+
+
+def _write(data_dir, relative_dir, symbol, period_type, statement, rows):
+    my_path = path.join(data_dir, relative_dir)
+    os.makedirs(my_path, exist_ok=True)
+    periods = ['2021', '2022'] if period_type == 'annual' else ['Q1 2022', 'Q2 2022']
+    with open(path.join(my_path, f"{symbol}{period_type}{statement}.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(['items'] + periods + ['ticker'])
+        for row in rows:
+            writer.writerow(row + [symbol])
+
+
+def _tree(data_dir):
+    income = [['Total Revenue', '1,000', '1,200'], ['Other, Net', '(5)', '--'], ['Other, Net', '7', '8']]
+    balance = [['Total Assets', '11,575', '12,204']]
+    for period_type in ['annual', 'quarterly']:
+        _write(data_dir, 'dow_jones_stocks/AAA', 'AAA', period_type, 'income-statement', income)
+        _write(data_dir, 'dow_jones_stocks/AAA', 'AAA', period_type, 'balance-sheet', balance)
+        # Copy of the competitor kept by get_competitor_data(), with a different value
+        _write(data_dir, 'dow_jones_stocks/AAA/competitors/BBB', 'BBB', period_type, 'income-statement',
+               [['Total Revenue', '1', '1']])
+        _write(data_dir, 'all_competitors/BBB', 'BBB', period_type, 'income-statement', income)
+    # Also saved under all_competitors, dow_jones_stocks is read first
+    _write(data_dir, 'all_competitors/AAA', 'AAA', 'annual', 'income-statement', [['Total Revenue', '9', '9']])
+
+
+def test_parse_value():
+    assert parse_value("(3,240)") == -3240
+    assert parse_value("--") is None
+    assert parse_value("11,575") == 11575
+    assert parse_value("") is None
+
+
+def test_filters():
+    with tempfile.TemporaryDirectory() as data_dir:
+        _tree(data_dir)
+        records = list(iter_statements(symbols='BBB', statements='income-statement', period_type='quarterly',
+                                       items='Total Revenue', data_dir=data_dir))
+        assert [(i.ticker, i.period, i.value) for i in records] == [('BBB', 'Q1 2022', 1000), ('BBB', 'Q2 2022', 1200)]
+
+        records = list(iter_statements(statements='balance-sheet', period_type='annual', data_dir=data_dir))
+        assert {(i.ticker, i.item) for i in records} == {('AAA', 'Total Assets')}
+
+        assert list(iter_statements(symbols=['CCC'], data_dir=data_dir)) == []
+        # AAA: 3 income and 1 balance sheet rows, BBB: 3 income rows, 2 periods each, annual and quarterly
+        assert len(list(iter_statements(data_dir=data_dir))) == (3 + 1 + 3) * 2 * 2
+
+
+def test_sources():
+    with tempfile.TemporaryDirectory() as data_dir:
+        _tree(data_dir)
+        revenue = {(i.ticker, i.period_type, i.period): i.value
+                   for i in iter_statements(items='Total Revenue', data_dir=data_dir)}
+        # BBB is only read from all_competitors, not from the copy in AAA/competitors
+        assert revenue[('BBB', 'annual', '2021')] == 1000
+        # AAA is only read from dow_jones_stocks
+        assert revenue[('AAA', 'annual', '2021')] == 1000
+        assert len(revenue) == 2 * 2 * 2
+
+
+def test_repeated_items():
+    with tempfile.TemporaryDirectory() as data_dir:
+        _tree(data_dir)
+        records = list(iter_statements(symbols='AAA', period_type='annual', items='Other, Net', data_dir=data_dir))
+        assert [(i.line, i.period, i.value) for i in records] == [
+            (1, '2021', -5), (1, '2022', None), (2, '2021', 7), (2, '2022', 8)]
+
+
+def test_batches():
+    with tempfile.TemporaryDirectory() as data_dir:
+        _tree(data_dir)
+        total = len(list(iter_statements(data_dir=data_dir)))
+        batches = list(iter_statement_batches(data_dir=data_dir, batch_size=5))
+        assert all(len(i) == 5 for i in batches[:-1])
+        assert 0 < len(batches[-1]) <= 5
+        assert sum(len(i) for i in batches) == total
+
+        for output, batch_size in [('csv', 10), ('records', 0)]:
+            try:
+                next(iter_statement_batches(data_dir=data_dir, batch_size=batch_size, output=output))
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"no ValueError for output={output!r}, batch_size={batch_size}")
+
+
+if __name__ == "__main__":
+    test_parse_value()
+    test_filters()
+    test_sources()
+    test_repeated_items()
+    test_batches()
+    print("statement reader ok")
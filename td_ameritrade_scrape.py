@@ -65,6 +65,12 @@ class td_ameritrade_scrape:
         After identifying which page the driver is currently on this method makes use of the quarter_data() 
         and annual_data() methods to create a new directory with a csv of the page's data.
 
+    get_statement(ticker, financial_statement, competitor=""):
+        Returns the quarterly and annual data of one report without writing any csv.
+
+    competitor_symbols():
+        Returns the competitors listed on the current WSJ quote page.
+
     get_competitors(ticker):
         Returns the competitors associated with the current company.
 
@@ -78,16 +84,13 @@ class td_ameritrade_scrape:
     """
     # print(td_ameritrade_scrape.td_ameritrade_scrape.__doc__) ### this works to view the docstring
 
-    def __init__(self,
-                 service=ChromeService(
-                     executable_path=ChromeDriverManager().install())
-                 ):
+    def __init__(self, service=None):
         """
         Constructs the webdriver to be activated.
 
         Parameters
         ----------
-        service : class
+        service : class, optional
 
                   Creates a new instance of Service.
 
@@ -101,13 +104,21 @@ class td_ameritrade_scrape:
                         List of args to pass to the chromedriver service
                     log_path : str, optional
                         Path for the chromedriver service to log to
+
+                  Installs the ChromeDriver with ChromeDriverManager when None.
         """
+        if service is None:
+            service = ChromeService(
+                executable_path=ChromeDriverManager().install())
         self.driver = webdriver.Chrome(service=service)
 
-    def dow_jones_symbols(self):
+    @staticmethod
+    def dow_jones_symbols():
         """
         Returns a list of the 30 stocks in the Dow Jones.
 
+        Does not use the browser, so it can be called on the class without starting Chrome.
+
         Returns
         -------
         list
@@ -436,23 +447,64 @@ class td_ameritrade_scrape:
             except NoSuchElementException:
                 pass
 
-    def get_competitors(self, ticker):
+    def get_statement(self, ticker, financial_statement, competitor=""):
         """
-        Returns the competitors associated with the current company.
+        Returns the quarterly and annual data of one report without writing any csv.
+
+        Used by crawl_worker.py where the data is sent back to the shared crawl queue
+        instead of being saved on the machine doing the scraping.
 
         Parameters
         ----------
         ticker : str
-                The current company stock ticker
+                The current stock ticker
+        financial_statement : str
+                The current report (balance-sheet, income-statement, cash-flow)
+        competitor : str, optional
+                the current competitor
+
+        Returns
+        -------
+        dict
+                Dataframes of the quarterly and annual data keyed by 'quarterly' and 'annual'
+        """
+        self.ticker = ticker
+        self.financial_statement = financial_statement
+        symbol = competitor if competitor != "" else ticker
+
+        self.set_url(
+            f"https://research.tdameritrade.com/grid/public/research/stocks/fundamentals?symbol={symbol}")
+        self.get_url()
+
+        if financial_statement == "balance-sheet":
+            self.switch_to_balance_sheet()
+        elif financial_statement == "income-statement":
+            self.switch_to_income_statement()
+        else:
+            self.switch_to_cash_flow_statement()
+
+        wait = WebDriverWait(self.driver, 10)
+        wait.until(EC.element_to_be_clickable(
+            (By.XPATH, "//span[text()='Quarter']"))).click()
+        time.sleep(5)
+        quarter_data_df = self.quarter_data(competitor=competitor)
+
+        wait.until(EC.element_to_be_clickable(
+            (By.XPATH, "//span[text()='Annual']"))).click()
+        time.sleep(5)
+        annual_data_df = self.annual_data(competitor=competitor)
+
+        return {'quarterly': quarter_data_df, 'annual': annual_data_df}
+
+    def competitor_symbols(self):
+        """
+        Returns the competitors listed on the current WSJ quote page.
 
         Returns
         -------
         list
-                The competitors associated with the current company documented on Wall Street Journal (WSJ).
-                [Not all competitors from WSJ are documented. These competitors are flagged because they are 
-                not listed on TD Ameritrade.]
+                The competitor stock tickers, names containing digits are left out
         """
-        dow_jones_list = self.dow_jones_symbols()
         html = self.driver.page_source
         soup = BeautifulSoup(html, 'html.parser')
 
@@ -472,6 +524,27 @@ class td_ameritrade_scrape:
                     if (result != True):
                         competitors.append(text)
 
+        return competitors
+
+    def get_competitors(self, ticker):
+        """
+        Returns the competitors associated with the current company.
+
+        Parameters
+        ----------
+        ticker : str
+                The current company stock ticker
+
+        Returns
+        -------
+        list
+                The competitors associated with the current company documented on Wall Street Journal (WSJ).
+                [Not all competitors from WSJ are documented. These competitors are flagged because they are 
+                not listed on TD Ameritrade.]
+        """
+        dow_jones_list = self.dow_jones_symbols()
+        competitors = self.competitor_symbols()
+
         other_competitors = []
 
         for competitor in competitors: